@@ -1,24 +1,823 @@
+import asyncio
+import functools
+import hashlib
+import hmac
+import logging
 import os
-from fastapi import FastAPI
-from sqlalchemy import create_engine, text
+import queue
+import re
+import time
+import urllib.parse
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.message import EmailMessage
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+# pydantic needs the typing_extensions TypedDict to build schemas on 3.11
+from typing_extensions import TypedDict
 
-if not DATABASE_URL:
+import aiosmtplib
+import orjson
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+_db_url = os.getenv("DATABASE_URL")
+
+if not _db_url:
     raise RuntimeError("DATABASE_URL is not set")
 
-engine = create_engine(DATABASE_URL)
+for _prefix in ("postgres://", "postgresql://"):
+    if _db_url.startswith(_prefix):
+        _db_url = "postgresql+asyncpg://" + _db_url[len(_prefix):]
+        break
+
+POOL_SIZE = 20
+
+# When DATABASE_URL points at PgBouncer in transaction-pooling mode,
+# PgBouncer owns pooling and asyncpg's server-side prepared statements
+# must be disabled (they break across pooled backend connections).
+USE_PGBOUNCER = os.getenv("PGBOUNCER", "") == "1"
+
+if USE_PGBOUNCER:
+    engine = create_async_engine(
+        _db_url,
+        poolclass=NullPool,
+        connect_args={
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+        },
+    )
+else:
+    engine = create_async_engine(
+        _db_url,
+        pool_size=POOL_SIZE,
+        max_overflow=10,
+        pool_timeout=30,
+        pool_recycle=1800,
+        pool_pre_ping=True,
+        connect_args={
+            "statement_cache_size": 1024,
+            "prepared_statement_cache_size": 512,
+        },
+    )
+
+app = FastAPI(default_response_class=ORJSONResponse)
+
+CORS_ORIGINS = [o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip()]
+ALL_ORIGINS = CORS_ORIGINS == ["*"]
+
+
+class SetCORSMiddleware(CORSMiddleware):
+    # Starlette's is_allowed_origin scans allow_origins as a list per
+    # request; a frozenset makes the check O(1) for long allowlists.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._origin_set = frozenset(self.allow_origins)
+
+    def is_allowed_origin(self, origin):
+        return ALL_ORIGINS or origin in self._origin_set
+
+
+app.add_middleware(
+    SetCORSMiddleware,
+    allow_origins=CORS_ORIGINS,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+MAX_BODY_BYTES = 64 * 1024
+MAX_LIST_ITEMS = 100
+
+
+@app.middleware("http")
+async def limit_body_size(request, call_next):
+    # Reject oversized payloads before any parsing happens, so a hostile
+    # body can never cost more than a header read.
+    cl = request.headers.get("content-length")
+    if cl and cl.isdigit() and int(cl) > MAX_BODY_BYTES:
+        return ORJSONResponse(status_code=413, content={"detail": "payload too large"})
+    return await call_next(request)
+
+
+# Single-statement helpers. AUTOCOMMIT skips the BEGIN/COMMIT round-trips
+# that engine.begin() would add around one INSERT or SELECT. Handlers
+# that run several statements pass an explicit conn so the whole request
+# shares one pool checkout (and one transaction, if the caller began one).
+async def db_exec(stmt, params=None, conn=None):
+    if conn is not None:
+        await conn.execute(stmt, params or {})
+        return
+    async with engine.connect() as c:
+        await c.execution_options(isolation_level="AUTOCOMMIT")
+        await c.execute(stmt, params or {})
+
+
+async def db_fetchall(stmt, params=None, conn=None):
+    if conn is not None:
+        res = await conn.execute(stmt, params or {})
+        return res.mappings().all()
+    async with engine.connect() as c:
+        await c.execution_options(isolation_level="AUTOCOMMIT")
+        res = await c.execute(stmt, params or {})
+        # RowMapping already behaves like a dict; copying every row into a
+        # real dict would just double the allocations.
+        return res.mappings().all()
+
+
+async def db_fetchone(stmt, params=None, conn=None):
+    if conn is not None:
+        res = await conn.execute(stmt, params or {})
+        return res.mappings().first()
+    async with engine.connect() as c:
+        await c.execution_options(isolation_level="AUTOCOMMIT")
+        res = await c.execute(stmt, params or {})
+        return res.mappings().first()
+
+
+# Kept for OpenAPI schema generation only; the webhook handlers validate
+# by hand (see _clean_submission) to keep Pydantic off the hot path.
+# Plain TypedDicts carry no validator graph or per-request instances.
+class BuyerSubmission(TypedDict, total=False):
+    name: str
+    email: str
+    phone: Optional[str]
+    countries: List[str]
+    regions: List[str]
+    categories: List[str]
+    budget_min: Optional[float]
+    budget_max: Optional[float]
+    notes: Optional[str]
+
+
+class SellerSubmission(TypedDict, total=False):
+    name: str
+    email: str
+    phone: Optional[str]
+    country: str
+    region: Optional[str]
+    city: Optional[str]
+    asset_type: str
+    price: Optional[float]
+    currency: Optional[str]
+    description: Optional[str]
+    images: List[str]
+    source_url: Optional[str]
+
+
+EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+BUYER_FIELDS = {
+    "required": ("name", "email"),
+    "strings": ("phone", "notes"),
+    "lists": ("countries", "regions", "categories"),
+    "numbers": ("budget_min", "budget_max"),
+}
+
+SELLER_FIELDS = {
+    "required": ("name", "email", "country", "asset_type"),
+    "strings": ("phone", "region", "city", "currency", "description", "source_url"),
+    "lists": ("images",),
+    "numbers": ("price",),
+}
+
+
+def _clean_submission(data, fields):
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=422, detail="invalid payload")
+    row = {}
+    for f in fields["required"]:
+        v = data.get(f)
+        if not isinstance(v, str) or not v.strip():
+            raise HTTPException(status_code=422, detail=f"{f} is required")
+        row[f] = v.strip()
+    for f in fields["strings"]:
+        v = data.get(f)
+        row[f] = v if isinstance(v, str) and v else None
+    for f in fields["lists"]:
+        v = data.get(f) or []
+        if not isinstance(v, list) or not all(isinstance(x, str) for x in v):
+            raise HTTPException(status_code=422, detail=f"{f} must be a list of strings")
+        if len(v) > MAX_LIST_ITEMS:
+            raise HTTPException(status_code=422, detail=f"{f} has too many items")
+        row[f] = v
+    for f in fields["numbers"]:
+        v = data.get(f)
+        if v in (None, ""):
+            row[f] = None
+        else:
+            try:
+                row[f] = float(v)
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=422, detail=f"{f} must be a number")
+    if not EMAIL_RE.match(row["email"]):
+        raise HTTPException(status_code=422, detail="invalid email")
+    return row
+
 
-app = FastAPI()
+# Statements are built once at import so SQLAlchemy's parse/compile work
+# is not repeated per request; db_exec/db_fetchall take the TextClause.
+BUYER_INSERT = text("""
+    INSERT INTO buyers (name, email, phone, countries, regions, categories,
+                        budget_min, budget_max, notes)
+    VALUES (:name, :email, :phone, :countries, :regions, :categories,
+            :budget_min, :budget_max, :notes)
+""")
+
+SELLER_INSERT = text("""
+    INSERT INTO sellers (name, email, phone, country, region, city, asset_type,
+                         price, currency, description, images, source_url)
+    VALUES (:name, :email, :phone, :country, :region, :city, :asset_type,
+            :price, :currency, :description, :images, :source_url)
+""")
+
+PING = text("SELECT 1")
+
+DB_TEST = text("SELECT 1 AS db")
+
+ADMIN_STATS = text("""
+    SELECT (SELECT count(*) FROM buyers) AS buyers,
+           (SELECT count(*) FROM sellers) AS sellers
+""")
+
+FLUSH_INTERVAL_SEC = 0.05
+FLUSH_BATCH_ROWS = 200
+
+_buyer_queue = asyncio.Queue()
+_seller_queue = asyncio.Queue()
+_flush_tasks = []
+
+
+async def _flush_loop(queue, insert_stmt):
+    # Drain submissions every FLUSH_INTERVAL_SEC or once FLUSH_BATCH_ROWS
+    # accumulate, so N webhook POSTs become one executemany round-trip.
+    loop = asyncio.get_running_loop()
+    while True:
+        rows = [await queue.get()]
+        deadline = loop.time() + FLUSH_INTERVAL_SEC
+        while len(rows) < FLUSH_BATCH_ROWS:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                rows.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        try:
+            await db_exec(insert_stmt, rows)
+        except Exception:
+            logging.getLogger("webhooks").exception("batch insert failed (%d rows)", len(rows))
+
+
+@app.on_event("startup")
+async def warm_pool():
+    if USE_PGBOUNCER:
+        return
+
+    async def ping():
+        async with engine.connect() as conn:
+            await conn.execute(PING)
+
+    await asyncio.gather(*(ping() for _ in range(POOL_SIZE)))
+
+
+# SMS deliveries log through a queue so stdout writes happen on the
+# listener thread, never inside the request.
+_log_queue = queue.SimpleQueue()
+_log_listener = None
+sms_logger = logging.getLogger("sms")
+
+
+@app.on_event("startup")
+async def start_log_listener():
+    global _log_listener
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(levelname)s %(message)s"))
+    _log_listener = QueueListener(_log_queue, handler)
+    _log_listener.start()
+    sms_logger.addHandler(QueueHandler(_log_queue))
+    sms_logger.setLevel(logging.INFO)
+    sms_logger.propagate = False
+
+
+@app.post("/webhooks/sms", response_model=None)
+async def sms_webhook(request: Request):
+    # Twilio posts a tiny urlencoded body; parse_qs on the raw bytes is
+    # far cheaper than spinning up Starlette's full form machinery.
+    body = await request.body()
+    data = urllib.parse.parse_qs(body.decode("utf-8", "replace"), max_num_fields=16)
+    sms_logger.info(
+        "sms from=%s body=%s",
+        data.get("From", [None])[0],
+        data.get("Body", [None])[0],
+    )
+    return _ok()
+
+
+@app.on_event("startup")
+async def start_flushers():
+    _flush_tasks.append(asyncio.create_task(_flush_loop(_buyer_queue, BUYER_INSERT)))
+    _flush_tasks.append(asyncio.create_task(_flush_loop(_seller_queue, SELLER_INSERT)))
+    _flush_tasks.append(asyncio.create_task(_ai_score_loop()))
+
+
+# Every webhook replies with the same body; pre-encode it once. The
+# Response object itself is built per request because the CORS middleware
+# mutates response headers in place, which would accumulate on a shared
+# singleton.
+_OK_BODY = b'{"ok":true}'
+
+
+def _ok():
+    return Response(content=_OK_BODY, media_type="application/json")
+
+
+def _body_schema(shape):
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": TypeAdapter(shape).json_schema()}},
+        }
+    }
+
+
+@app.post("/webhooks/buyer", response_model=None, openapi_extra=_body_schema(BuyerSubmission))
+async def buyer_webhook(request: Request):
+    row = _clean_submission(orjson.loads(await request.body()), BUYER_FIELDS)
+    _buyer_queue.put_nowait(row)
+    return _ok()
+
+
+@app.post("/webhooks/seller", response_model=None, openapi_extra=_body_schema(SellerSubmission))
+async def seller_webhook(request: Request):
+    row = _clean_submission(orjson.loads(await request.body()), SELLER_FIELDS)
+    _seller_queue.put_nowait(row)
+    return _ok()
+
+
+# Load-balancer probes hit / far more often than once a second, so the
+# ISO timestamp is recomputed at most once per second instead of per hit.
+_health_time = ("", 0.0)
 
 
 @app.get("/")
-def health():
-    return {"status": "ok"}
+async def health():
+    global _health_time
+    t = time.time()
+    if t - _health_time[1] > 1.0:
+        _health_time = (datetime.fromtimestamp(t, timezone.utc).isoformat(), t)
+    return ORJSONResponse(content={"status": "ok", "time": _health_time[0]})
+
+
+# Lowercased/encoded once at import; the per-request check is a single
+# constant-time compare so the header can't be timing-probed.
+_ADMIN_EMAIL_LOWER = (os.getenv("ADMIN_EMAIL") or "").lower().encode()
+
+
+def _check_admin(x_admin_email):
+    if not _ADMIN_EMAIL_LOWER or not x_admin_email:
+        raise HTTPException(status_code=401, detail="unauthorized")
+    if not hmac.compare_digest(x_admin_email.lower().encode(), _ADMIN_EMAIL_LOWER):
+        raise HTTPException(status_code=401, detail="unauthorized")
+
+
+@app.get("/admin/stats")
+async def admin_stats(x_admin_email: Optional[str] = Header(default=None)):
+    _check_admin(x_admin_email)
+    rows = await db_fetchall(ADMIN_STATS)
+    # Returning the Response directly skips the recursive jsonable_encoder
+    # walk FastAPI would otherwise run over the row.
+    return ORJSONResponse(content=dict(rows[0]) if rows else {})
 
 
 @app.get("/db-test")
-def db_test():
-    with engine.connect() as conn:
-        result = conn.execute(text("SELECT 1"))
-        return {"db": result.scalar()}
+async def db_test():
+    rows = await db_fetchall(DB_TEST)
+    return ORJSONResponse(content=dict(rows[0]))
+
+
+def _json(v):
+    return orjson.dumps(v).decode()
+
+
+class DealIngest(BaseModel):
+    source: str
+    source_uid: Optional[str] = None
+    title: str
+    description: Optional[str] = None
+    price: Optional[float] = None
+    currency: Optional[str] = None
+    country: Optional[str] = None
+    region: Optional[str] = None
+    category: Optional[str] = None
+    source_url: Optional[str] = None
+    images: List[str] = []
+    posted_at: Optional[datetime] = None
+    raw: Optional[dict] = None
+
+
+DEAL_UPSERT = text("""
+    INSERT INTO deals (source, source_uid, title, description, price, currency,
+                       country, region, category, source_url, images, raw, posted_at)
+    VALUES (:source, :source_uid, :title, :description, :price, :currency,
+            :country, :region, :category, :source_url, :images,
+            cast(:raw as jsonb), coalesce(:posted_at, now()))
+    ON CONFLICT (source, source_uid) DO UPDATE SET
+        title = excluded.title,
+        description = excluded.description,
+        price = excluded.price,
+        currency = excluded.currency,
+        country = excluded.country,
+        region = excluded.region,
+        category = excluded.category,
+        source_url = excluded.source_url,
+        images = excluded.images,
+        raw = excluded.raw
+    RETURNING id, title, price, country, region, category, posted_at
+""")
+
+EVENT_INSERT = text("""
+    INSERT INTO ingest_events (kind, payload)
+    VALUES (:kind, cast(:payload as jsonb))
+""")
+
+NOTIFICATION_INSERT = text("""
+    INSERT INTO notifications (buyer_email, subject, body)
+    VALUES (:buyer_email, :subject, :body)
+""")
+
+NOTIFICATIONS_PICK = text("""
+    SELECT id, buyer_email, subject, body FROM notifications
+    WHERE status = 'queued' ORDER BY created_at LIMIT :limit
+""")
+
+NOTIFICATION_MARK_SENT = text("""
+    UPDATE notifications SET status = 'sent', sent_at = now() WHERE id = :id
+""")
+
+DEAL_AI_UPDATE = text("""
+    UPDATE deals SET ai_score = :ai_score, ai_reason = :ai_reason WHERE id = :id
+""")
+
+MATCH_THRESHOLD = float(os.getenv("MATCH_THRESHOLD", "0.5"))
+
+# Matching runs entirely in Postgres: one INSERT ... SELECT scores every
+# active buyer with the weighted sum (budget 0.4 / location 0.3 /
+# category 0.2 / recency 0.1), keeps rows at or above the threshold and
+# upserts them into matches, returning only the matched buyers. Scales
+# with matching buyers instead of shipping the whole table to Python.
+MATCH_SCORE_INSERT = text("""
+    WITH scored AS (
+        SELECT b.id AS buyer_id,
+               CASE
+                   WHEN cast(:price as numeric) IS NULL
+                        OR (b.budget_min IS NULL AND b.budget_max IS NULL) THEN 0.5
+                   WHEN cast(:price as numeric) >= coalesce(b.budget_min, cast(:price as numeric))
+                        AND cast(:price as numeric) <= coalesce(b.budget_max, cast(:price as numeric)) THEN 1.0
+                   WHEN cast(:price as numeric) <= coalesce(b.budget_max, cast(:price as numeric)) THEN 0.6
+                   ELSE 0.3
+               END AS budget,
+               CASE
+                   WHEN cast(:country as text) IS NOT NULL
+                        AND lower(cast(:country as text)) = ANY (SELECT lower(c) FROM unnest(b.countries) c) THEN 1.0
+                   WHEN cast(:region as text) IS NOT NULL
+                        AND lower(cast(:region as text)) = ANY (SELECT lower(r) FROM unnest(b.regions) r) THEN 0.7
+                   WHEN coalesce(array_length(b.countries, 1), 0) = 0 THEN 0.5
+                   ELSE 0.0
+               END AS location,
+               CASE
+                   WHEN cast(:category as text) IS NOT NULL
+                        AND lower(cast(:category as text)) = ANY (SELECT lower(k) FROM unnest(b.categories) k) THEN 1.0
+                   WHEN coalesce(array_length(b.categories, 1), 0) = 0 THEN 0.5
+                   ELSE 0.0
+               END AS category
+        FROM buyers b
+        WHERE b.status = 'active'
+    )
+    INSERT INTO matches (deal_id, buyer_id, score, breakdown)
+    SELECT cast(:deal_id as uuid),
+           buyer_id,
+           0.4 * budget + 0.3 * location + 0.2 * category + 0.1 * cast(:recency as numeric),
+           jsonb_build_object('budget', budget, 'location', location,
+                              'category', category, 'recency', cast(:recency as numeric))
+    FROM scored
+    WHERE 0.4 * budget + 0.3 * location + 0.2 * category + 0.1 * cast(:recency as numeric)
+          >= cast(:threshold as numeric)
+    ON CONFLICT (deal_id, buyer_id) DO UPDATE SET
+        score = excluded.score,
+        breakdown = excluded.breakdown
+    RETURNING buyer_id, score,
+              (SELECT email FROM buyers WHERE buyers.id = matches.buyer_id) AS email
+""")
+
+
+def _recency(posted_at):
+    if posted_at is None:
+        return 0.7
+    age_h = (datetime.now(timezone.utc) - posted_at).total_seconds() / 3600.0
+    return 1.0 if age_h <= 24 else 0.7 if age_h <= 168 else 0.4
+
+
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASS = os.getenv("SMTP_PASS")
+SMTP_FROM = os.getenv("SMTP_FROM", SMTP_USER or "noreply@vortexai.app")
+
+
+# One authenticated connection reused across batches: STARTTLS + LOGIN
+# happen once per connection instead of once per send call.
+_smtp_client = None
+_smtp_lock = asyncio.Lock()
+
+
+async def _smtp_connect():
+    global _smtp_client
+    if _smtp_client is None or not _smtp_client.is_connected:
+        _smtp_client = aiosmtplib.SMTP(hostname=SMTP_HOST, port=SMTP_PORT,
+                                       use_tls=False, start_tls=True, timeout=30)
+        await _smtp_client.connect()
+        if SMTP_USER:
+            await _smtp_client.login(SMTP_USER, SMTP_PASS)
+    return _smtp_client
+
+
+async def _send_notifications(rows):
+    sent = []
+    smtp = await _smtp_connect()
+    for row in rows:
+        msg = EmailMessage()
+        msg["From"] = SMTP_FROM
+        msg["To"] = row["buyer_email"]
+        msg["Subject"] = row["subject"]
+        msg.set_content(row["body"])
+        try:
+            try:
+                await smtp.send_message(msg)
+            except aiosmtplib.SMTPServerDisconnected:
+                # Idle connections get dropped by the relay; reconnect
+                # once and retry this message before giving up on it.
+                smtp = await _smtp_connect()
+                await smtp.send_message(msg)
+            sent.append(row["id"])
+        except aiosmtplib.SMTPException:
+            logging.getLogger("notify").exception("send failed to %s", row["buyer_email"])
+    return sent
+
+
+async def enqueue_notification(rows, conn=None):
+    await db_exec(NOTIFICATION_INSERT, rows, conn=conn)
+
+
+_notify_tasks = set()
+
+
+async def send_queued_notifications(limit=50):
+    if not SMTP_HOST:
+        return 0
+    # The lock spans pick through mark-sent so overlapping flush tasks
+    # never pick (and send) the same queued rows; it also serializes use
+    # of the shared SMTP session, which carries one command at a time.
+    async with _smtp_lock:
+        rows = await db_fetchall(NOTIFICATIONS_PICK, {"limit": limit})
+        if not rows:
+            return 0
+        sent_ids = await _send_notifications(rows)
+        if sent_ids:
+            await db_exec(NOTIFICATION_MARK_SENT, [{"id": i} for i in sent_ids])
+    return len(sent_ids)
+
+
+AI_SCORE_TIMEOUT_SEC = 15
+
+
+@functools.lru_cache(maxsize=1)
+def get_openai():
+    # Imported lazily so workers that never score a deal don't pay the
+    # openai import graph (httpx, schemas) at startup or fork.
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=10, max_retries=2)
+
+
+async def score_deals_ai(deals):
+    # Scores a batch of deals with one prompt; returns a list of
+    # (score, reason) aligned with the input, or None when scoring is
+    # disabled or the call fails.
+    if not os.getenv("OPENAI_API_KEY"):
+        return None
+    listing = [
+        {
+            "title": d.title,
+            "description": d.description,
+            "price": d.price,
+            "currency": d.currency,
+            "category": d.category,
+            "country": d.country,
+        }
+        for d in deals
+    ]
+    prompt = (
+        "Rate each deal listing for quality and legitimacy on a 0..1 scale. "
+        "Reply with JSON only: an array with one object per input deal, in "
+        'order: [{"score": <float>, "reason": "<short reason>"}, ...].\n'
+        + orjson.dumps(listing).decode()
+    )
+    try:
+        resp = await asyncio.wait_for(
+            get_openai().responses.create(
+                model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+                input=prompt,
+            ),
+            AI_SCORE_TIMEOUT_SEC,
+        )
+        data = orjson.loads(resp.output_text)
+        results = [
+            (max(0.0, min(1.0, float(item["score"]))), str(item.get("reason") or ""))
+            for item in data[:len(deals)]
+        ]
+        results += [(None, None)] * (len(deals) - len(results))
+        return results
+    except Exception:
+        logging.getLogger("ai").exception("deal scoring failed (%d deals)", len(deals))
+        return None
+
+
+SCORE_CACHE_GET = text("""
+    SELECT key, score, reason FROM deal_score_cache
+    WHERE key = ANY(cast(:keys as text[]))
+""")
+
+SCORE_CACHE_PUT = text("""
+    INSERT INTO deal_score_cache (key, score, reason)
+    VALUES (:key, :score, :reason)
+    ON CONFLICT (key) DO NOTHING
+""")
+
+SCORE_CACHE_MAX = 4096
+
+# Hot scores in process (LRU via OrderedDict), the rest in
+# deal_score_cache. Re-scraped deals with unchanged content hash to the
+# same key, so repeat ingests skip the LLM entirely.
+_score_cache = OrderedDict()
+
+
+def _deal_score_key(payload):
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{payload.title}|{payload.description}|{payload.price}|{payload.category}".encode())
+    return h.hexdigest()
+
+
+def _score_cache_get(key):
+    try:
+        val = _score_cache.pop(key)
+    except KeyError:
+        return None
+    _score_cache[key] = val
+    return val
+
+
+def _score_cache_put(key, val):
+    _score_cache.pop(key, None)
+    _score_cache[key] = val
+    while len(_score_cache) > SCORE_CACHE_MAX:
+        _score_cache.popitem(last=False)
+
+
+AI_BATCH_MAX = 16
+AI_BATCH_WINDOW_SEC = 0.2
+
+_ai_queue = asyncio.Queue()
+
+
+async def _ai_score_loop():
+    # Coalesces deals arriving within a short window into one LLM call and
+    # backfills ai_score/ai_reason, so bulk scraper runs pay per batch,
+    # not per deal, and the webhook never waits on the model.
+    loop = asyncio.get_running_loop()
+    while True:
+        items = [await _ai_queue.get()]
+        deadline = loop.time() + AI_BATCH_WINDOW_SEC
+        while len(items) < AI_BATCH_MAX:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(_ai_queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        keyed = [(deal_id, payload, _deal_score_key(payload)) for deal_id, payload in items]
+
+        resolved = {}
+        for _, _, key in keyed:
+            hit = _score_cache_get(key)
+            if hit is not None:
+                resolved[key] = hit
+        missing = list({k for _, _, k in keyed if k not in resolved})
+        if missing:
+            try:
+                for r in await db_fetchall(SCORE_CACHE_GET, {"keys": missing}):
+                    val = (float(r["score"]), r["reason"] or "")
+                    resolved[r["key"]] = val
+                    _score_cache_put(r["key"], val)
+            except Exception:
+                logging.getLogger("ai").exception("score cache read failed")
+
+        todo, seen = [], set()
+        for _, payload, key in keyed:
+            if key not in resolved and key not in seen:
+                seen.add(key)
+                todo.append((key, payload))
+        if todo:
+            results = await score_deals_ai([p for _, p in todo])
+            if results:
+                cache_rows = []
+                for (key, _), (score, reason) in zip(todo, results):
+                    if score is None:
+                        continue
+                    resolved[key] = (score, reason)
+                    _score_cache_put(key, (score, reason))
+                    cache_rows.append({"key": key, "score": score, "reason": reason})
+                if cache_rows:
+                    try:
+                        await db_exec(SCORE_CACHE_PUT, cache_rows)
+                    except Exception:
+                        logging.getLogger("ai").exception("score cache write failed")
+
+        updates = [
+            {"id": deal_id, "ai_score": resolved[key][0], "ai_reason": resolved[key][1]}
+            for deal_id, _, key in keyed
+            if key in resolved
+        ]
+        if updates:
+            try:
+                await db_exec(DEAL_AI_UPDATE, updates)
+            except Exception:
+                logging.getLogger("ai").exception("ai score backfill failed")
+
+
+@app.post("/webhooks/deal-ingest", response_model=None)
+async def deal_ingest_webhook(payload: DealIngest):
+    if not payload.source_uid:
+        if not payload.source_url:
+            raise HTTPException(status_code=422, detail="source_uid or source_url required")
+        # Stable digest of the URL (mirrors scrapers._uid) so the same
+        # listing keys the same (source, source_uid) upsert on every
+        # ingest, and the uid stays short regardless of URL length.
+        payload.source_uid = hashlib.blake2b(payload.source_url.encode(),
+                                             digest_size=16).hexdigest()
+
+    params = payload.model_dump()
+    params["raw"] = _json(payload.raw) if payload.raw is not None else None
+
+    # One connection and one transaction for the whole ingest: upsert,
+    # match scoring, notification enqueue and audit commit atomically
+    # instead of paying a pool checkout + BEGIN/COMMIT per statement.
+    async with engine.connect() as conn:
+        async with conn.begin():
+            deal = await db_fetchone(DEAL_UPSERT, params, conn=conn)
+            matched = await db_fetchall(MATCH_SCORE_INSERT, {
+                "deal_id": deal["id"],
+                "price": payload.price,
+                "country": payload.country,
+                "region": payload.region,
+                "category": payload.category,
+                "recency": _recency(deal["posted_at"]),
+                "threshold": MATCH_THRESHOLD,
+            }, conn=conn)
+            if matched:
+                await enqueue_notification([
+                    {
+                        "buyer_email": m["email"],
+                        "subject": f"New deal match: {deal['title']}",
+                        "body": (
+                            f"A new deal matches your profile: {deal['title']}\n"
+                            f"Match score: {float(m['score']):.2f}\n"
+                            f"Link: {payload.source_url or 'n/a'}\n"
+                        ),
+                    }
+                    for m in matched
+                ], conn=conn)
+            await db_exec(EVENT_INSERT, {"kind": "deal_ingest",
+                                         "payload": payload.model_dump_json()},
+                          conn=conn)
+
+    _ai_queue.put_nowait((deal["id"], payload))
+
+    # Emails go out in the background: the webhook answers in DB-write
+    # time and the scraper's ingest loop never waits on SMTP. The set
+    # keeps a strong reference until each flush task finishes.
+    task = asyncio.create_task(send_queued_notifications(limit=50))
+    _notify_tasks.add(task)
+    task.add_done_callback(_notify_tasks.discard)
+
+    return ORJSONResponse(content={
+        "ok": True,
+        "deal_id": str(deal["id"]),
+        "matches": len(matched),
+    })
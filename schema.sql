@@ -28,3 +28,57 @@ create table if not exists sellers (
   source_url text,
   created_at timestamptz default now()
 );
+create table if not exists deals (
+  id uuid primary key default gen_random_uuid(),
+  source text not null,
+  source_uid text not null,
+  title text not null,
+  description text,
+  price numeric,
+  currency text,
+  country text,
+  region text,
+  category text,
+  source_url text,
+  images text[] default '{}',
+  raw jsonb,
+  posted_at timestamptz default now(),
+  created_at timestamptz default now(),
+  unique (source, source_uid)
+);
+create table if not exists matches (
+  id uuid primary key default gen_random_uuid(),
+  deal_id uuid not null references deals(id),
+  buyer_id uuid not null references buyers(id),
+  score numeric not null,
+  breakdown jsonb,
+  created_at timestamptz default now(),
+  unique (deal_id, buyer_id)
+);
+create table if not exists notifications (
+  id uuid primary key default gen_random_uuid(),
+  buyer_email text not null,
+  subject text not null,
+  body text not null,
+  status text default 'queued',
+  created_at timestamptz default now(),
+  sent_at timestamptz
+);
+create table if not exists ingest_events (
+  id uuid primary key default gen_random_uuid(),
+  kind text not null,
+  payload jsonb,
+  created_at timestamptz default now()
+);
+alter table buyers add column if not exists status text default 'active';
+alter table deals add column if not exists ai_score numeric;
+alter table deals add column if not exists ai_reason text;
+create table if not exists deal_score_cache (
+  key text primary key,
+  score numeric not null,
+  reason text,
+  created_at timestamptz default now()
+);
+create index if not exists buyers_categories_gin on buyers using gin (categories);
+create index if not exists buyers_countries_gin on buyers using gin (countries);
+create index if not exists buyers_regions_gin on buyers using gin (regions);